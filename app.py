@@ -1,9 +1,11 @@
 # app.py
 import json
+import re
+from collections import deque
 from typing import List, Dict
-from copy import deepcopy
 import streamlit as st
 import time
+import sys
 
 import logic as L  # <-- NEW: use the pure-logic module
 
@@ -14,33 +16,47 @@ import logic as L  # <-- NEW: use the pure-logic module
 # Reuse constants from logic
 GROUPS = L.GROUPS
 POT_LABELS = L.POT_LABELS
+LOG_MAXLEN = 200  # keep the draw log (re-sent on every rerun) bounded
+
+def clone_pots(pots: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    """
+    Copy a pots mapping. Team dicts only hold str/int leaves, so a per-team
+    shallow copy is enough and far cheaper than deepcopy.
+    """
+    return {k: [t.copy() for t in v] for k, v in pots.items()}
 
 def init_session_state():
     """
     Initialize state exactly once and seed default pots so we never hit KeyError ('pot1').
     """
     if "initialized" not in st.session_state:
-        st.session_state.pots = deepcopy(DEFAULT_POTS)  # seed defaults
+        st.session_state.pots = clone_pots(DEFAULT_POTS)  # seed defaults
         st.session_state.groups = {g: [] for g in GROUPS}
         st.session_state.draw_order = {p: [] for p in POT_LABELS}
         st.session_state.queue = []  # list of tuples (pot_label, team_index_in_pot_snapshot)
-        st.session_state.log = []
+        st.session_state.log = deque(maxlen=LOG_MAXLEN)
         st.session_state.seed = None
+        L.draw_rng(st.session_state)  # the one RNG every shuffle shares
+        L.reset_tracking(st.session_state)
         st.session_state.initialized = True
         if "pots_baseline" not in st.session_state:
-            st.session_state.pots_baseline = deepcopy(st.session_state.pots)
+            st.session_state.pots_baseline = clone_pots(st.session_state.pots)
 
     # Safety guard in case someone cleared pots elsewhere
     for key in POT_LABELS:
         st.session_state.pots.setdefault(key, [])
 
 def reset_state(pots):
-    # Deep-copy to avoid mutating caller/defaults
-    st.session_state.pots = deepcopy(pots)
+    # Copy to avoid mutating caller/defaults
+    st.session_state.pots = clone_pots(pots)
     st.session_state.groups = {g: [] for g in GROUPS}
     st.session_state.draw_order = {p: [] for p in POT_LABELS}
     st.session_state.queue = []
-    st.session_state.log = []
+    st.session_state.log = deque(maxlen=LOG_MAXLEN)
+    L.reset_tracking(st.session_state)
+    L.clear_queues(st.session_state)  # queued teams belong to the old pots
+    # Replay the same draw for the same seed after a reset
+    L.draw_rng(st.session_state).seed(st.session_state.seed)
 
 def soft_reset_to_baseline():
     """Reset the draw back to the last configured pots (baseline), preserving the seed toggle."""
@@ -61,21 +77,34 @@ def render_title():
         unsafe_allow_html=True,
     )
 
+def groups_key(groups) -> tuple:
+    """Hashable (group, ((name, confederation), ...)) snapshot used as the HTML cache key."""
+    return tuple(sorted(
+        (g, tuple((t["name"], t["confederation"]) for t in teams)) for g, teams in groups.items()
+    ))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_groups_html(key: tuple) -> str:
+    """
+    Build all 12 group cards as a single HTML grid so the page emits one element
+    (and one markdown parse) per rerun instead of one per line.
+    """
+    card = "border:1px solid #e5e7eb;border-radius:14px;padding:8px 10px;margin-bottom:12px;background:#fff;box-shadow:0 1px 2px rgba(0,0,0,.04);"
+    parts = ["<div style='display:grid;grid-template-columns:repeat(4,1fr);gap:12px;'>"]
+    for g, teams in key:
+        # Fill with placeholders to 4 slots
+        slots = [f"{name} ({confed})" for name, confed in teams] + ["—"] * (4 - len(teams))
+        items = "".join(f"<li>{slot}</li>" for slot in slots)
+        parts.append(
+            f"<div style='{card}'><h3 style='margin:4px 0 8px;'>Group {g}</h3>"
+            f"<ul style='margin:0;padding-left:20px;'>{items}</ul></div>"
+        )
+    parts.append("</div>")
+    return "".join(parts)
+
 def render_groups_table(groups):
-    # 12 groups in a grid (4 columns x 3 rows)
-    cols = st.columns(4)
-    for idx, g in enumerate(GROUPS):
-        with cols[idx % 4]:
-            st.markdown(f"### Group {g}")
-            teams = groups[g]
-            # Fill with placeholders to 4 slots
-            rows = teams + [{"name":"—","confederation":"—","pot":"—"}]*(4-len(teams))
-            style = "border:1px solid #e5e7eb;border-radius:14px;padding:8px 10px;margin-bottom:12px;background:#fff;box-shadow:0 1px 2px rgba(0,0,0,.04);"
-            st.markdown(f"<div style='{style}'>", unsafe_allow_html=True)
-            for t in rows:
-                slot = f"{t['name']} ({t['confederation']})" if t['name']!="—" else "—"
-                st.markdown(f"- {slot}")
-            st.markdown("</div>", unsafe_allow_html=True)
+    # 12 groups in a grid (4 columns x 3 rows), rendered in one markdown call
+    st.markdown(build_groups_html(groups_key(groups)), unsafe_allow_html=True)
 
 
 def show_failure_and_autoretry(msg: str, seconds: int = 3):
@@ -126,25 +155,42 @@ def show_failure_and_autoretry(msg: str, seconds: int = 3):
         st.experimental_rerun()
 
 
+@st.cache_data(show_spinner=False, max_entries=256)
+def build_pots_html(key: tuple) -> str:
+    """Build the pots section (divider, heading and four columns) as a single HTML block (see build_groups_html)."""
+    parts = [
+        "<hr><h2>Pots (remaining)</h2>",
+        "<div style='display:grid;grid-template-columns:repeat(4,1fr);gap:12px;'>",
+    ]
+    for pot_label, teams in key:
+        parts.append(f"<div><h4 style='margin-bottom:4px'>{pot_label.upper()}</h4>")
+        if teams:
+            for name, confed in teams:
+                parts.append(
+                    f"<div style='padding:4px 6px;margin:2px 0;border-radius:6px;background:#ffffff;border:1px solid #eee;'>"
+                    f"<strong>{name}</strong> <span style='opacity:0.7'>({confed})</span>"
+                    f"</div>"
+                )
+        else:
+            parts.append("<span style='opacity:0.6;font-style:italic;'>Empty</span>")
+        parts.append("</div>")
+    parts.append("</div>")
+    return "".join(parts)
+
 def render_pots(pots):
-    st.markdown("---")
-    st.markdown("## Pots (remaining)")
-    # Display all four pots in one row
-    pot_cols = st.columns(4)
-
-    for i, pot_label in enumerate(POT_LABELS):
-        with pot_cols[i]:
-            st.markdown(f"<h4 style='margin-bottom:4px'>{pot_label.upper()}</h4>", unsafe_allow_html=True)
-            if pots.get(pot_label):
-                for t in pots[pot_label]:
-                    st.markdown(
-                        f"<div style='padding:4px 6px;margin:2px 0;border-radius:6px;background:#ffffff;border:1px solid #eee;'>"
-                        f"<strong>{t['name']}</strong> <span style='opacity:0.7'>({t['confederation']})</span>"
-                        f"</div>",
-                        unsafe_allow_html=True
-                    )
-            else:
-                st.markdown("<span style='opacity:0.6;font-style:italic;'>Empty</span>", unsafe_allow_html=True)
+    # Display all four pots in one row, in the same single markdown call as the heading
+    key = tuple(
+        (pot_label, tuple((t["name"], t["confederation"]) for t in pots.get(pot_label, [])))
+        for pot_label in POT_LABELS
+    )
+    st.markdown(build_pots_html(key), unsafe_allow_html=True)
+
+# One pot textarea line: "Name, Confederation[, ignored...]" is captured in
+# groups 1-2, any other non-blank line in group 3. Blank lines don't match.
+_POT_LINE_RE = re.compile(
+    r"^[^\S\n]*(?:([^,\n]*?)[^\S\n]*,[^\S\n]*([^,\n]*?)[^\S\n]*(?:,[^\n]*)?|(\S[^\n]*?)[^\S\n]*)$",
+    re.M,
+)
 
 def parse_pot_string(pot_text: str, pot_num: int) -> List[Dict]:
     """
@@ -152,20 +198,53 @@ def parse_pot_string(pot_text: str, pot_num: int) -> List[Dict]:
         🇲🇽 Mexico, CONCACAF
         🇺🇸 United States, CONCACAF
     into a list of {name, confederation, pot}.
-    Blank lines are ignored.
+    Blank lines are ignored; invalid lines are skipped and reported in a single
+    warning. Every call returns freshly built team dicts, so callers may keep
+    the result without copying it. Names and confederations are interned.
     """
     teams = []
-    for line in pot_text.strip().splitlines():
-        if not line.strip():
-            continue
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) < 2:
-            st.warning(f"Skipping invalid line in Pot {pot_num}: '{line}' (expected 'Name, Confederation')")
+    bad = []
+    for name, confed, invalid in _POT_LINE_RE.findall(pot_text):
+        if invalid:
+            bad.append(invalid)
             continue
-        name, confed = parts[0], parts[1]
-        teams.append({"name": name, "confederation": confed, "pot": pot_num})
+        teams.append({"name": sys.intern(name), "confederation": sys.intern(confed), "pot": pot_num})
+    if bad:
+        st.warning(
+            f"Skipping {len(bad)} invalid line(s) in Pot {pot_num} (expected 'Name, Confederation'): "
+            + ", ".join(f"'{line}'" for line in bad)
+        )
     return teams
 
+@st.cache_resource(show_spinner=False, max_entries=64)
+def cached_full_draw(key: tuple, seed: int):
+    """
+    Memoized L.compute_full_draw. cache_resource hands back the same objects
+    on every hit (no copy-on-read), so callers must copy before mutating.
+    """
+    return L.compute_full_draw(key, seed)
+
+def run_complete_draw() -> bool:
+    """
+    Complete the draw. A seeded draw that hasn't started yet is deterministic,
+    so it is served from cache; otherwise fall back to L.complete_draw.
+    """
+    state = st.session_state
+    if state.seed is None or any(state.groups[g] for g in GROUPS):
+        return L.complete_draw(state)
+
+    state.pop("error", None)  # clear last error if any
+    groups, pots, log, error = cached_full_draw(L.pots_key(state.pots), state.seed)
+    state.groups = {g: list(teams) for g, teams in groups.items()}
+    state.pots = {label: list(teams) for label, teams in pots.items()}
+    state.log = deque(log, maxlen=LOG_MAXLEN)
+    L.reset_tracking(state)
+    L.clear_queues(state)
+    if error:
+        state["error"] = error
+        return False
+    return True
+
 def ui_controls():
     c1, c2, c3 = st.columns([1,1,1])
     with c1:
@@ -182,7 +261,7 @@ def ui_controls():
                 show_failure_and_autoretry(str(e))
     with c2:
         if st.button("🏁 Complete the draw", use_container_width=True):
-            ok = L.complete_draw(st.session_state)
+            ok = run_complete_draw()
             if not ok or "error" in st.session_state:
                 show_failure_and_autoretry(st.session_state.pop("error", "A constraint couldn’t be fulfilled."))
 
@@ -254,6 +333,12 @@ DEFAULT_POTS = {
     ]
 }
 
+# Textarea defaults derived once from DEFAULT_POTS instead of on every rerun
+DEFAULT_POT_TEXTS = {
+    i: "\n".join(f"{t['name']}, {t['confederation']}" for t in DEFAULT_POTS[f"pot{i}"])
+    for i in range(1, 5)
+}
+
 def main():
     st.set_page_config(page_title="World Cup 2026 Draw Simulator", layout="wide")
     init_session_state()
@@ -264,23 +349,18 @@ def main():
         st.markdown("### Settings")
         seed = st.number_input("Random seed (optional)", value=0, step=1)
         seed_toggle = st.checkbox("Use seed", value=False)
-        st.session_state.seed = seed if seed_toggle else None
+        new_seed = seed if seed_toggle else None
+        if new_seed != st.session_state.seed:
+            L.draw_rng(st.session_state).seed(new_seed)
+        st.session_state.seed = new_seed
 
         st.markdown("### Pots Setup")
 
-        # Pre-fill each pot's textarea from DEFAULT_POTS
-        default_pot_texts = {
-            1: "\n".join([f"{t['name']}, {t['confederation']}" for t in DEFAULT_POTS["pot1"]]),
-            2: "\n".join([f"{t['name']}, {t['confederation']}" for t in DEFAULT_POTS["pot2"]]),
-            3: "\n".join([f"{t['name']}, {t['confederation']}" for t in DEFAULT_POTS["pot3"]]),
-            4: "\n".join([f"{t['name']}, {t['confederation']}" for t in DEFAULT_POTS["pot4"]]),
-        }
-
         pot_inputs = {}
         for pot_num in range(1, 5):
             pot_inputs[pot_num] = st.text_area(
                 f"Pot {pot_num} teams (one per line: 'Team Name, Confederation')",
-                value=default_pot_texts[pot_num],
+                value=DEFAULT_POT_TEXTS[pot_num],  # pre-filled from DEFAULT_POTS
                 height=180
             )
 
@@ -306,7 +386,9 @@ def main():
 
                 if ok:
                     reset_state(new_pots)
-                    st.session_state.pots_baseline = deepcopy(new_pots)  # keep baseline in sync
+                    # keep baseline in sync; new_pots holds fresh dicts from parse_pot_string
+                    # and reset_state copied it, so nothing else aliases it
+                    st.session_state.pots_baseline = new_pots
                     st.success("Pots successfully updated.")
             except Exception as e:
                 st.error(f"Error parsing pots: {e}")
@@ -322,8 +404,7 @@ def main():
 
     # Log
     with st.expander("Draw log"):
-        for line in st.session_state.log:
-            st.write(line)
+        st.markdown("\n".join(f"- {line}" for line in st.session_state.log))
 
 if __name__ == "__main__":
     main()
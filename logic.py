@@ -1,12 +1,17 @@
 # logic.py
-from typing import List, Dict, Tuple, Set, Optional
+from typing import List, Dict, Tuple, Set, FrozenSet, Optional, Iterable, Iterator
+from collections import deque
+from functools import lru_cache
 import random
+import sys
 
 # ----------------------------
 # ------- Core Constants -----
 # ----------------------------
 
 GROUPS = [chr(c) for c in range(ord('A'), ord('L') + 1)]  # A..L
+GROUP_INDEX = {g: i for i, g in enumerate(GROUPS)}
+GROUP_SIZE = 4
 POT_LABELS = ["pot1", "pot2", "pot3", "pot4"]
 
 HOSTS_POT1 = [
@@ -14,10 +19,17 @@ HOSTS_POT1 = [
     ("🇨🇦 Canada", "B"),
     ("🇺🇸 United States", "D"),
 ]
+HOST_GROUP_OF = {sys.intern(name): g for name, g in HOSTS_POT1}
+HOST_NAMES = frozenset(HOST_GROUP_OF)
 UEFA = "UEFA"
 MAX_PER_CONFED = 1
 MAX_UEFA = 2
 
+# Confederations are counted by small int id. These ids are fixed; any other
+# confederation gets the next free id in its own state (see confed_id).
+CONFED_IDS: Dict[str, int] = {UEFA: 0, "CONMEBOL": 1, "CONCACAF": 2, "CAF": 3, "AFC": 4, "OFC": 5}
+UEFA_ID = CONFED_IDS[UEFA]
+
 # ----------------------------
 # -------- Helpers --------
 # ----------------------------
@@ -26,12 +38,92 @@ def set_error(state: Dict, msg: str) -> None:
     state["error"] = msg
     state["log"].append(f"❌ {msg}")
 
-def team_already_placed(groups: Dict[str, List[Dict]], team: Dict) -> bool:
-    name = team["name"]
-    for g in GROUPS:
-        if any(t["name"] == name for t in groups[g]):
-            return True
-    return False
+def team_already_placed(placed: Set[str], team: Dict) -> bool:
+    """`placed` is the state's placed-name index, state["placed_names"]."""
+    return team["name"] in placed
+
+def confed_id(state: Dict, confed: str) -> int:
+    """Id of `confed` in this state's registry, adding it (and a counter slot) if new."""
+    ids = state["confed_ids"]
+    cid = ids.get(confed)
+    if cid is None:
+        cid = ids[confed] = len(ids)
+        for counts in state["confed_counts"]:
+            counts.append(0)
+    return cid
+
+def reset_tracking(state: Dict) -> None:
+    """
+    Rebuild the incremental indexes from the current groups; every state must
+    go through this before its first draw step. Groups are addressed by index
+    into GROUPS and confederations by confed_id:
+    - confed_ids: confederation -> id, CONFED_IDS plus any others in play
+    - confed_counts: confed_counts[i][cid] = teams of `cid` in GROUPS[i]
+    - confed_full: confed_full[confed] has bit i set iff GROUPS[i] is at the limit for `confed`
+    - size_masks: size_masks[k] has bit i set iff GROUPS[i] holds k teams
+    - placed_names: names of every team already in a group
+    """
+    # Register every confederation in play first so the counters cover them.
+    ids = dict(CONFED_IDS)
+    for teams in list(state["pots"].values()) + [state["groups"][g] for g in GROUPS]:
+        for t in teams:
+            ids.setdefault(t["confederation"], len(ids))
+    counts = [bytearray(len(ids)) for _ in GROUPS]
+    full: Dict[str, int] = {}
+    masks = [0] * (GROUP_SIZE + 1)
+    for i, g in enumerate(GROUPS):
+        for t in state["groups"][g]:
+            cid = ids[t["confederation"]]
+            counts[i][cid] += 1
+            if not confed_ok_to_add(counts[i], cid):
+                full[t["confederation"]] = full.get(t["confederation"], 0) | 1 << i
+        masks[len(state["groups"][g])] |= 1 << i
+    state["confed_ids"] = ids
+    state["confed_counts"] = counts
+    state["confed_full"] = full
+    state["size_masks"] = masks
+    state["placed_names"] = {t["name"] for g in GROUPS for t in state["groups"][g]}
+
+def place_team(state: Dict, g: str, team: Dict) -> None:
+    """Append `team` to group `g`, keeping the tracking indexes in sync."""
+    counts = state["confed_counts"]
+    full = state["confed_full"]
+    masks = state["size_masks"]
+    placed = state["placed_names"]
+    i = GROUP_INDEX[g]
+    bit = 1 << i
+    cid = confed_id(state, team["confederation"])
+    size = len(state["groups"][g])
+    state["groups"][g].append(team)
+    counts[i][cid] += 1
+    if not confed_ok_to_add(counts[i], cid):
+        full[team["confederation"]] = full.get(team["confederation"], 0) | bit
+    masks[size] &= ~bit
+    masks[size + 1] |= bit
+    placed.add(team["name"])
+
+def lowest_group(bits: int) -> str:
+    """Alphabetically first group in a non-empty group bitmask."""
+    return GROUPS[(bits & -bits).bit_length() - 1]
+
+def draw_rng(state: Dict) -> random.Random:
+    """
+    Session RNG shared by every shuffle, created from state["seed"] on first use.
+    Re-seeding it per call would replay the same permutation for every pot.
+    """
+    if "rng" not in state:
+        state["rng"] = random.Random(state.get("seed"))
+    return state["rng"]
+
+@lru_cache(maxsize=None)
+def mask_bits(bits: int) -> Tuple[int, ...]:
+    """Single-group bits of a group bitmask, lowest first (at most 4096 masks)."""
+    out = []
+    while bits:
+        b = bits & -bits
+        out.append(b)
+        bits ^= b
+    return tuple(out)
 
 def clear_queues(state: Dict, which: Optional[List[str]] = None) -> None:
     """Remove stale draw queues after non-incremental placements."""
@@ -44,81 +136,169 @@ def clear_queues(state: Dict, which: Optional[List[str]] = None) -> None:
 # -------- Core Logic --------
 # ----------------------------
 
-def confed_ok_to_add(group: List[Dict], team: Dict) -> bool:
-    confeds = [t["confederation"] for t in group]
-    confed = team["confederation"]
-    if confed == UEFA:
-        return confeds.count(UEFA) < MAX_UEFA
-    else:
-        return confeds.count(confed) < MAX_PER_CONFED
-
-def first_available_group_for_pot1_after_hosts(groups_filled: Dict[str, List[Dict]]) -> Optional[str]:
-    for g in GROUPS:
-        if len(groups_filled[g]) == 0:
-            return g
-    return None
+def confed_ok_to_add(confed_count: bytearray, cid: int) -> bool:
+    """
+    `confed_count` is one group's counter from confed_counts; `cid` a confed_id.
+    Hot paths read the precomputed confed_full masks instead.
+    """
+    limit = MAX_UEFA if cid == UEFA_ID else MAX_PER_CONFED
+    return confed_count[cid] < limit
+
+def first_available_group_for_pot1_after_hosts(masks: List[int]) -> Optional[str]:
+    return lowest_group(masks[0]) if masks[0] else None
 
 def first_available_group_with_constraints(
-    groups_filled: Dict[str, List[Dict]],
+    masks: List[int],
+    full: Dict[str, int],
     team: Dict,
     target_size: int,
     allow_fallback: bool = False
 ) -> Optional[str]:
     """
     Return the first alphabetical group that respects confed constraints
-    and currently has `target_size` teams.
+    and currently has `target_size` teams (per the `size_masks` index).
     If allow_fallback=True: fallback to any group with < target_size+1 that fits.
     """
-    for g in GROUPS:
-        if len(groups_filled[g]) == target_size and confed_ok_to_add(groups_filled[g], team):
-            return g
-    if allow_fallback:
-        for g in GROUPS:
-            if len(groups_filled[g]) < target_size + 1 and confed_ok_to_add(groups_filled[g], team):
-                return g
-    return None
+    bits = candidate_mask(team, masks, full, target_size)
+    if not bits and allow_fallback:
+        closed = full.get(team["confederation"], 0)
+        for k in range(target_size + 1):
+            bits |= masks[k]
+        bits &= ~closed
+    return lowest_group(bits) if bits else None
 
 # ---------- Generic candidate & matching ----------
 
-def candidate_groups(team: Dict, groups_after: Dict[str, List[Dict]], required_size: int) -> List[str]:
-    return [
-        g for g in GROUPS
-        if len(groups_after[g]) == required_size and confed_ok_to_add(groups_after[g], team)
-    ]
+def candidate_mask(team: Dict, masks: List[int], full: Dict[str, int], required_size: int) -> int:
+    """Groups of size `required_size` that can take `team`, as a bitmask (bit i <=> GROUPS[i])."""
+    return masks[required_size] & ~full.get(team["confederation"], 0)
 
-def perfect_matching(
-    groups_after: Dict[str, List[Dict]],
-    remaining_teams: List[Dict],
-    required_size: int
-) -> Optional[Dict[str, str]]:
+def candidate_masks(teams: List[Dict], masks: List[int], full: Dict[str, int], required_size: int) -> List[int]:
     """
-    Bipartite matching: teams -> groups (of current size `required_size`).
-    Returns {group -> team_name} if perfect assignment exists; else None.
+    candidate_mask of every team, as an int array aligned with `teams`. These
+    stay fixed while a pot is placed: a placement only takes its group away.
     """
-    candidates: Dict[str, List[str]] = {
-        t["name"]: candidate_groups(t, groups_after, required_size) for t in remaining_teams
-    }
-    if any(len(v) == 0 for v in candidates.values()):
+    open_groups = masks[required_size]
+    return [open_groups & ~full.get(t["confederation"], 0) for t in teams]
+
+def match_masks(masks: List[int]) -> Optional[List[int]]:
+    """
+    Core of perfect_matching on candidate bitmasks: choose a distinct group
+    bit from every mask. Returns the chosen bits (aligned with `masks`) or None.
+
+    Solved with Hopcroft-Karp after a cheap Hall's-condition precheck that
+    rejects most infeasible inputs without searching.
+    """
+    n = len(masks)
+    if n == 0:
+        return []
+    # A team with no candidate group at all: stops at the first one found.
+    if not all(masks):
         return None
 
-    match_team_for_group: Dict[str, str] = {}  # group -> team_name
+    # Hall's condition on the whole set and on every class of teams sharing
+    # a candidate mask (in practice one class per confederation): k teams
+    # need at least k groups between them.
+    union = 0
+    classes: Dict[int, int] = {}  # candidate mask -> number of teams
+    for m in masks:
+        classes[m] = classes.get(m, 0) + 1
+        union |= m
+    if bin(union).count("1") < n:
+        return None
+    for m, k in classes.items():
+        if k > 1 and bin(m).count("1") < k:
+            return None
 
-    def try_assign(team_name: str, seen_groups: Set[str]) -> bool:
-        for g in sorted(candidates[team_name]):
-            if g in seen_groups:
-                continue
-            seen_groups.add(g)
-            if g not in match_team_for_group or try_assign(match_team_for_group[g], seen_groups):
-                match_team_for_group[g] = team_name
+    # Hopcroft-Karp on the bitmasks: seed a greedy matching, then repeatedly
+    # BFS-layer the graph from the unmatched teams and augment along
+    # vertex-disjoint shortest paths. A BFS that reaches no free group
+    # proves no perfect matching exists.
+    unreached = n + 1
+    adj = [mask_bits(m) for m in masks]  # each team's group bits, lowest first
+    chosen = [0] * n  # group bit per team, 0 while unmatched
+    owner: Dict[int, int] = {}  # group bit -> team index
+    for u, bits in enumerate(adj):
+        for b in bits:
+            if b not in owner:
+                owner[b] = u
+                chosen[u] = b
+                break
+    dist = [unreached] * n  # BFS layer per team, rebuilt every phase
+
+    def augment(u: int) -> bool:
+        for b in adj[u]:
+            v = owner.get(b)
+            if v is None or (dist[v] == dist[u] + 1 and augment(v)):
+                owner[b] = u
+                chosen[u] = b
                 return True
+        dist[u] = unreached
         return False
 
-    # Small heuristic: order teams by fewest options first (reduces dead-ends).
-    order = sorted(remaining_teams, key=lambda t: len(candidates[t["name"]]))
-    for t in order:
-        if not try_assign(t["name"], set()):
+    while True:
+        layer = [u for u in range(n) if not chosen[u]]
+        if not layer:
+            return chosen
+        dist = [unreached] * n
+        for u in layer:
+            dist[u] = 0
+        found_free = False
+        depth = 0
+        while layer and not found_free:
+            depth += 1
+            nxt = []
+            for u in layer:
+                for b in adj[u]:
+                    v = owner.get(b)
+                    if v is None:
+                        found_free = True
+                    elif dist[v] == unreached:
+                        dist[v] = depth
+                        nxt.append(v)
+            layer = nxt
+        if not found_free:
             return None
-    return match_team_for_group
+        for u in range(n):
+            if not chosen[u]:
+                augment(u)
+
+def hall_slack_ok(classes: Iterable[Tuple[int, int]], taken: int) -> bool:
+    """
+    Hall's condition per class of teams sharing a candidate mask: each class
+    of k teams must still have k of its groups outside `taken`.
+    """
+    for m, k in classes:
+        if bin(m & ~taken).count("1") < k:
+            return False
+    return True
+
+@lru_cache(maxsize=4096)
+def _matchable(key: Tuple[int, ...]) -> bool:
+    return match_masks(list(key)) is not None
+
+def can_match(masks: List[int]) -> bool:
+    """Feasibility-only match_masks, memoized on the sorted tuple of masks."""
+    return _matchable(tuple(sorted(masks)))
+
+def perfect_matching(
+    masks: List[int],
+    full: Dict[str, int],
+    remaining_teams: List[Dict],
+    required_size: int
+) -> Optional[Dict[str, str]]:
+    """
+    Bipartite matching: teams -> groups (of current size `required_size`).
+    Groups are described only by the size_masks / confed_full indexes.
+    Returns {group -> team_name} if perfect assignment exists; else None.
+    """
+    chosen = match_masks(candidate_masks(remaining_teams, masks, full, required_size))
+    if chosen is None:
+        return None
+    match_team_for_group: Dict[str, str] = {
+        lowest_group(b): t["name"] for t, b in zip(remaining_teams, chosen)
+    }  # group -> team_name
+    return {g: match_team_for_group[g] for g in GROUPS if g in match_team_for_group}
 
 # ----------------------------
 # --------- Pot Steps --------
@@ -126,32 +306,33 @@ def perfect_matching(
 
 def pot1(state: Dict) -> bool:
     pot = state["pots"]["pot1"]
-    names = {t["name"]: t for t in pot}
 
     # Fixed hosts
-    for name, group in HOSTS_POT1:
-        if name in names and len(state["groups"][group]) == 0:
-            t = names[name]
-            if not team_already_placed(state["groups"], t):
-                state["groups"][group].append(t)
-            if t in pot:
-                pot.remove(t)
+    rest = []
+    for t in pot:
+        group = HOST_GROUP_OF.get(t["name"])
+        if group is not None and not state["groups"][group]:
+            if not team_already_placed(state["placed_names"], t):
+                place_team(state, group, t)
             state["log"].append(f"Pot1: {t['name']} to Group {group}")
+        else:
+            rest.append(t)
+    pot[:] = rest
 
     # Remaining top seeds
-    rnd = random.Random(state.get("seed"))
+    rnd = draw_rng(state)
     rnd.shuffle(pot)
-    for team in list(pot):
-        if team_already_placed(state["groups"], team):
-            # sanitize: if already placed somehow, just remove from pot
-            state["pots"]["pot1"].remove(team)
+    while pot:
+        team = pot.pop(0)
+        if team_already_placed(state["placed_names"], team):
+            # sanitize: if already placed somehow, just drop it from the pot
             continue
-        g = first_available_group_for_pot1_after_hosts(state["groups"])
+        g = first_available_group_for_pot1_after_hosts(state["size_masks"])
         if g is None:
+            pot.insert(0, team)
             break
-        state["groups"][g].append(team)
+        place_team(state, g, team)
         state["log"].append(f"Pot1: {team['name']} to Group {g}")
-        state["pots"]["pot1"].remove(team)
     clear_queues(state, ["p1_queue"])  # safety
     return True
 
@@ -161,25 +342,28 @@ def pot2(state: Dict) -> bool:
     solve the entire remaining set with perfect matching and commit.
     """
     pot = state["pots"]["pot2"]
-    rnd = random.Random(state.get("seed"))
+    masks, full = state["size_masks"], state["confed_full"]
+    rnd = draw_rng(state)
     rnd.shuffle(pot)
+    queue = deque(pot)
 
-    for _ in range(len(pot)):
-        team = pot[0]
-        if team_already_placed(state["groups"], team):
-            pot.remove(team)
+    while queue:
+        team = queue[0]
+        if team_already_placed(state["placed_names"], team):
+            queue.popleft()
             continue
-        g = first_available_group_with_constraints(state["groups"], team, target_size=1, allow_fallback=False)
+        g = first_available_group_with_constraints(masks, full, team, target_size=1, allow_fallback=False)
         if g is not None:
-            state["groups"][g].append(team)
+            queue.popleft()
+            place_team(state, g, team)
             state["log"].append(f"Pot2: {team['name']} to Group {g}")
-            state["pots"]["pot2"].remove(team)
             continue
 
         # Global fix-up
-        remaining = list(state["pots"]["pot2"])
-        mapping = perfect_matching(state["groups"], remaining, required_size=1)
+        remaining = list(queue)
+        mapping = perfect_matching(masks, full, remaining, required_size=1)
         if mapping is None:
+            pot[:] = queue
             set_error(state, f"Pot2 placement failed for {team['name']}.")
             return False
 
@@ -187,14 +371,14 @@ def pot2(state: Dict) -> bool:
         name_to_team = {t["name"]: t for t in remaining}
         for gg, tname in mapping.items():
             tt = name_to_team[tname]
-            if not team_already_placed(state["groups"], tt):
-                state["groups"][gg].append(tt)
-            if tt in state["pots"]["pot2"]:
-                state["pots"]["pot2"].remove(tt)
+            if not team_already_placed(state["placed_names"], tt):
+                place_team(state, gg, tt)
             state["log"].append(f"Pot2: {tt['name']} to Group {gg}")
+        pot.clear()
         clear_queues(state, ["p2_queue"])
         return True
 
+    pot.clear()
     clear_queues(state, ["p2_queue"])
     return True
 
@@ -204,85 +388,157 @@ def pot3(state: Dict) -> bool:
     solve the entire remaining set with perfect matching and commit.
     """
     pot = state["pots"]["pot3"]
-    rnd = random.Random(state.get("seed"))
+    masks, full = state["size_masks"], state["confed_full"]
+    rnd = draw_rng(state)
     rnd.shuffle(pot)
+    queue = deque(pot)
 
-    for _ in range(len(pot)):
-        team = pot[0]
-        if team_already_placed(state["groups"], team):
-            pot.remove(team)
+    while queue:
+        team = queue[0]
+        if team_already_placed(state["placed_names"], team):
+            queue.popleft()
             continue
-        g = first_available_group_with_constraints(state["groups"], team, target_size=2, allow_fallback=False)
+        g = first_available_group_with_constraints(masks, full, team, target_size=2, allow_fallback=False)
         if g is not None:
-            state["groups"][g].append(team)
+            queue.popleft()
+            place_team(state, g, team)
             state["log"].append(f"Pot3: {team['name']} to Group {g}")
-            state["pots"]["pot3"].remove(team)
             continue
 
         # Global fix-up
-        remaining = list(state["pots"]["pot3"])
-        mapping = perfect_matching(state["groups"], remaining, required_size=2)
+        remaining = list(queue)
+        mapping = perfect_matching(masks, full, remaining, required_size=2)
         if mapping is None:
+            pot[:] = queue
             set_error(state, f"Pot3 placement failed for {team['name']}.")
             return False
 
         name_to_team = {t["name"]: t for t in remaining}
         for gg, tname in mapping.items():
             tt = name_to_team[tname]
-            if not team_already_placed(state["groups"], tt):
-                state["groups"][gg].append(tt)
-            if tt in state["pots"]["pot3"]:
-                state["pots"]["pot3"].remove(tt)
+            if not team_already_placed(state["placed_names"], tt):
+                place_team(state, gg, tt)
             state["log"].append(f"Pot3: {tt['name']} to Group {gg}")
+        pot.clear()
         clear_queues(state, ["p3_queue"])
         return True
 
+    pot.clear()
     clear_queues(state, ["p3_queue"])
     return True
 
-def pot4_possibilities(groups_now: Dict[str, List[Dict]], team: Dict) -> List[str]:
-    return candidate_groups(team, groups_now, required_size=3)
+def pot4_backtrack(
+    masks: List[int],
+    full: Dict[str, int],
+    remaining: List[Dict]
+) -> Optional[List[Tuple[str, Dict]]]:
+    """
+    Assign every `remaining` pot-4 team a size-3 group by backtracking search.
+    Returns [(group, team)] in the order of `remaining`, or None if infeasible.
+    """
+    cands = candidate_masks(remaining, masks, full, required_size=3)
+    n = len(remaining)
+    chosen = [0] * n  # group bit per team, 0 while unplaced
+    order = list(range(n))  # placed teams first, then unplaced in input order
+    left: Dict[int, int] = {}  # candidate mask -> unplaced teams with it
+    for m in cands:
+        left[m] = left.get(m, 0) + 1
+
+    def open_frame(depth: int, filled: int) -> Tuple[int, int, int, List[int], Iterator[int]]:
+        k = min(range(depth, n), key=lambda k: bin(cands[order[k]] & ~filled).count("1"))
+        i = order.pop(k)
+        order.insert(depth, i)
+        rest = [cands[j] for j in order[depth + 1:]]
+        bits = mask_bits(cands[i] & ~filled)
+        if len(bits) > 1:
+            bits = sorted(bits, key=lambda b: sum(1 for m in rest if m & b))
+        left[cands[i]] -= 1
+        return i, k, filled, rest, iter(bits)
+
+    if n == 0:
+        return []
+
+    stack = [open_frame(0, 0)]  # one frame per placed team
+    while stack:
+        i, k, filled, rest, bits = stack[-1]
+        for b in bits:
+            taken = filled | b
+            if hall_slack_ok(left.items(), taken) and can_match([m & ~taken for m in rest]):
+                chosen[i] = b
+                break
+        else:
+            chosen[i] = 0
+            left[cands[i]] += 1
+            order.insert(k, order.pop(len(stack) - 1))
+            stack.pop()
+            continue
+        if len(stack) == n:
+            return [(lowest_group(b), team) for b, team in zip(chosen, remaining)]
+        stack.append(open_frame(len(stack), taken))
+    return None
 
 def pot4(state: Dict) -> bool:
     """
     Pot 4: Backtracking w/ feasibility via perfect_matching for remaining.
     """
     pot = list(state["pots"]["pot4"])
-    rnd = random.Random(state.get("seed"))
+    rnd = draw_rng(state)
     rnd.shuffle(pot)
 
-    def backtrack(groups_snapshot: Dict[str, List[Dict]], remaining: List[Dict], placed_sequence: List[Tuple[str, Dict]]):
-        if not remaining:
-            return groups_snapshot, placed_sequence
-
-        team = remaining[0]
-        for g in sorted(pot4_possibilities(groups_snapshot, team)):
-            new_groups = {k: list(v) for k, v in groups_snapshot.items()}
-            new_groups[g] = list(new_groups[g]) + [team]
-            if perfect_matching(new_groups, remaining[1:], required_size=3) is not None:
-                res = backtrack(new_groups, remaining[1:], placed_sequence + [(g, team)])
-                if res is not None:
-                    return res
-        return None
-
-    start_groups = {k: list(v) for k, v in state["groups"].items()}
-    result = backtrack(start_groups, pot, [])
-    if result is None:
+    sequence = pot4_backtrack(state["size_masks"], state["confed_full"], pot)
+    if sequence is None:
         set_error(state, "Pot4 placement failed to find a feasible assignment.")
         return False
 
-    final_groups, sequence = result
-    state["groups"] = final_groups
     for g, team in sequence:
+        place_team(state, g, team)
         state["log"].append(f"Pot4: {team['name']} to Group {g}")
     state["pots"]["pot4"] = []
     clear_queues(state, ["p4_queue"])
     return True
 
+def match_pot(state: Dict, pot_label: str, required_size: int) -> bool:
+    """
+    Shuffle a pot and place all of it with one match_masks call. Returns False,
+    with the error set and nothing placed, if no assignment exists.
+    """
+    pot = state["pots"][pot_label]
+    masks, full = state["size_masks"], state["confed_full"]
+    rnd = draw_rng(state)
+    rnd.shuffle(pot)
+    placed = state["placed_names"]
+    teams = [t for t in pot if not team_already_placed(placed, t)]
+    chosen = match_masks(candidate_masks(teams, masks, full, required_size))
+    if chosen is None:
+        set_error(state, f"Pot{required_size + 1} placement failed to find a feasible assignment.")
+        return False
+
+    for team, b in zip(teams, chosen):
+        g = lowest_group(b)
+        place_team(state, g, team)
+        state["log"].append(f"Pot{required_size + 1}: {team['name']} to Group {g}")
+    pot.clear()
+    clear_queues(state, [f"p{required_size + 1}_queue"])
+    return True
+
 # ----------------------------
 # ---- Incremental Drawing ----
 # ----------------------------
 
+def fresh_queue(state: Dict, pot_label: str, exclude: FrozenSet[str] = frozenset()) -> deque:
+    """
+    Drop already-placed teams from a pot and return the rest, minus `exclude`,
+    shuffled as its draw queue. This is the only stale-team check, so every
+    path that places teams outside the queue or resets the draw must
+    clear_queues.
+    """
+    pot = state["pots"][pot_label]
+    placed = state["placed_names"]
+    pot[:] = [t for t in pot if not team_already_placed(placed, t)]
+    queue = [t for t in pot if t["name"] not in exclude]
+    draw_rng(state).shuffle(queue)
+    return deque(queue)
+
 def draw_next_team(state: Dict):
     """
     Draw one team respecting rules; never throws.
@@ -290,73 +546,62 @@ def draw_next_team(state: Dict):
     """
     # Pot 1
     if state["pots"]["pot1"]:
-        for nm, grp in HOSTS_POT1:
-            if any(t["name"] == nm for t in state["pots"]["pot1"]) and len(state["groups"][grp]) == 0:
-                t = next(t for t in state["pots"]["pot1"] if t["name"] == nm)
-                if not team_already_placed(state["groups"], t):
-                    state["groups"][grp].append(t)
-                state["pots"]["pot1"].remove(t)
+        pot = state["pots"]["pot1"]
+        for t in pot:
+            grp = HOST_GROUP_OF.get(t["name"])
+            if grp is not None and not state["groups"][grp]:
+                if not team_already_placed(state["placed_names"], t):
+                    place_team(state, grp, t)
+                pot.remove(t)
                 state["log"].append(f"Pot1: {t['name']} to Group {grp}")
                 return
 
         if "p1_queue" not in state or not state["p1_queue"]:
-            rnd = random.Random(state.get("seed"))
-            host_names = {nm for nm, _ in HOSTS_POT1}
-            p1 = [t for t in state["pots"]["pot1"] if t["name"] not in host_names]
-            rnd.shuffle(p1)
-            state["p1_queue"] = p1
-
-        team = state["p1_queue"].pop(0)
-        if team_already_placed(state["groups"], team):
-            # skip stale
-            if team in state["pots"]["pot1"]:
-                state["pots"]["pot1"].remove(team)
-            return
-        g = first_available_group_for_pot1_after_hosts(state["groups"])
+            state["p1_queue"] = fresh_queue(state, "pot1", exclude=HOST_NAMES)
+            if not state["p1_queue"]:
+                return
+
+        team = state["p1_queue"].popleft()
+        g = first_available_group_for_pot1_after_hosts(state["size_masks"])
         if g is None:
             state["log"].append("No slot found for Pot1 (unexpected).")
             return
-        state["groups"][g].append(team)
-        state["pots"]["pot1"].remove(team)
+        place_team(state, g, team)
+        pot.remove(team)
         state["log"].append(f"Pot1: {team['name']} to Group {g}")
         return
 
     # Pot 2
     if state["pots"]["pot2"]:
         if "p2_queue" not in state or not state["p2_queue"]:
-            rnd = random.Random(state.get("seed"))
-            p2 = list(state["pots"]["pot2"])
-            rnd.shuffle(p2)
-            state["p2_queue"] = p2
-
-        team = state["p2_queue"].pop(0)
-        if team_already_placed(state["groups"], team):
-            if team in state["pots"]["pot2"]:
-                state["pots"]["pot2"].remove(team)
-            return
-        g = first_available_group_with_constraints(state["groups"], team, target_size=1)
+            state["p2_queue"] = fresh_queue(state, "pot2")
+            if not state["p2_queue"]:
+                return
+
+        team = state["p2_queue"].popleft()
+        masks, full = state["size_masks"], state["confed_full"]
+        g = first_available_group_with_constraints(masks, full, team, target_size=1)
         if g is None:
             # try global
-            remaining = [team] + list(state["p2_queue"])
-            mapping = perfect_matching(state["groups"], remaining, required_size=1)
+            remaining = [team, *state["p2_queue"]]
+            mapping = perfect_matching(masks, full, remaining, required_size=1)
             if mapping is None:
                 state["log"].append(f"Pot2: no legal slot yet for {team['name']} — try again or change seed.")
-                state["p2_queue"].insert(0, team)
+                state["p2_queue"].appendleft(team)
                 return
             name_to_team = {t["name"]: t for t in remaining}
             for gg, tname in mapping.items():
                 tt = name_to_team[tname]
-                if not team_already_placed(state["groups"], tt):
-                    state["groups"][gg].append(tt)
-                if tt in state["pots"]["pot2"]:
-                    state["pots"]["pot2"].remove(tt)
-                if tt in state["p2_queue"]:
-                    state["p2_queue"].remove(tt)
+                if not team_already_placed(state["placed_names"], tt):
+                    place_team(state, gg, tt)
                 state["log"].append(f"Pot2: {tt['name']} to Group {gg}")
+            committed = set(mapping.values())
+            pot = state["pots"]["pot2"]
+            pot[:] = [t for t in pot if t["name"] not in committed]
             clear_queues(state, ["p2_queue"])
             return
 
-        state["groups"][g].append(team)
+        place_team(state, g, team)
         state["pots"]["pot2"].remove(team)
         state["log"].append(f"Pot2: {team['name']} to Group {g}")
         return
@@ -364,40 +609,35 @@ def draw_next_team(state: Dict):
     # Pot 3
     if state["pots"]["pot3"]:
         if "p3_queue" not in state or not state["p3_queue"]:
-            rnd = random.Random(state.get("seed"))
-            p3 = list(state["pots"]["pot3"])
-            rnd.shuffle(p3)
-            state["p3_queue"] = p3
-
-        team = state["p3_queue"].pop(0)
-        if team_already_placed(state["groups"], team):
-            if team in state["pots"]["pot3"]:
-                state["pots"]["pot3"].remove(team)
-            return
+            state["p3_queue"] = fresh_queue(state, "pot3")
+            if not state["p3_queue"]:
+                return
 
-        g = first_available_group_with_constraints(state["groups"], team, target_size=2)
+        team = state["p3_queue"].popleft()
+
+        masks, full = state["size_masks"], state["confed_full"]
+        g = first_available_group_with_constraints(masks, full, team, target_size=2)
         if g is None:
-            remaining = [team] + list(state["p3_queue"])
-            mapping = perfect_matching(state["groups"], remaining, required_size=2)
+            remaining = [team, *state["p3_queue"]]
+            mapping = perfect_matching(masks, full, remaining, required_size=2)
             if mapping is None:
                 state["log"].append(f"Pot3: failed to place {team['name']}.")
                 state["error"] = f"Pot 3 failed: cannot place {team['name']} under constraints."
-                state["p3_queue"].insert(0, team)
+                state["p3_queue"].appendleft(team)
                 return
             name_to_team = {t["name"]: t for t in remaining}
             for gg, tname in mapping.items():
                 tt = name_to_team[tname]
-                if not team_already_placed(state["groups"], tt):
-                    state["groups"][gg].append(tt)
-                if tt in state["pots"]["pot3"]:
-                    state["pots"]["pot3"].remove(tt)
-                if tt in state["p3_queue"]:
-                    state["p3_queue"].remove(tt)
+                if not team_already_placed(state["placed_names"], tt):
+                    place_team(state, gg, tt)
                 state["log"].append(f"Pot3: {tt['name']} to Group {gg}")
+            committed = set(mapping.values())
+            pot = state["pots"]["pot3"]
+            pot[:] = [t for t in pot if t["name"] not in committed]
             clear_queues(state, ["p3_queue"])
             return
 
-        state["groups"][g].append(team)
+        place_team(state, g, team)
         state["pots"]["pot3"].remove(team)
         state["log"].append(f"Pot3: {team['name']} to Group {g}")
         return
@@ -405,62 +645,38 @@ def draw_next_team(state: Dict):
     # Pot 4
     if state["pots"]["pot4"]:
         if "p4_queue" not in state or not state["p4_queue"]:
-            rnd = random.Random(state.get("seed"))
-            p4 = list(state["pots"]["pot4"])
-            rnd.shuffle(p4)
-            state["p4_queue"] = p4
-
-        team = state["p4_queue"].pop(0)
-        if team_already_placed(state["groups"], team):
-            if team in state["pots"]["pot4"]:
-                state["pots"]["pot4"].remove(team)
-            return
+            state["p4_queue"] = fresh_queue(state, "pot4")
+            if not state["p4_queue"]:
+                return
+
+        team = state["p4_queue"].popleft()
 
-        cands = sorted(pot4_possibilities(state["groups"], team))
-        for g in cands:
-            new_groups = {k: list(v) for k, v in state["groups"].items()}
-            new_groups[g] = list(new_groups[g]) + [team]
-            remaining = list(state["pots"]["pot4"])
-            remaining.remove(team)
-            if perfect_matching(new_groups, remaining, required_size=3) is not None:
-                state["groups"][g].append(team)
+        masks, full = state["size_masks"], state["confed_full"]
+        remaining = [t for t in state["pots"]["pot4"] if t["name"] != team["name"]]
+        rest = candidate_masks(remaining, masks, full, required_size=3)
+        for taken in mask_bits(candidate_mask(team, masks, full, required_size=3)):
+            if can_match([m & ~taken for m in rest]):
+                g = lowest_group(taken)
+                place_team(state, g, team)
                 state["pots"]["pot4"].remove(team)
                 state["log"].append(f"Pot4: {team['name']} to Group {g}")
                 return
 
         # Full backtrack fallback
-        try_full = [team] + list(state.get("p4_queue", []))
-        start_groups = {k: list(v) for k, v in state["groups"].items()}
-
-        def backtrack(groups_snapshot, rem):
-            if not rem:
-                return groups_snapshot, []
-            t = rem[0]
-            for gg in sorted(pot4_possibilities(groups_snapshot, t)):
-                newg = {k: list(v) for k, v in groups_snapshot.items()}
-                newg[gg] = list(newg[gg]) + [t]
-                if perfect_matching(newg, rem[1:], required_size=3) is not None:
-                    res = backtrack(newg, rem[1:])
-                    if res is not None:
-                        gfinal, seq = res
-                        return gfinal, [(gg, t)] + seq
-            return None
-
-        res = backtrack(start_groups, try_full)
-        if res is None:
+        try_full = [team, *state.get("p4_queue", ())]
+        seq = pot4_backtrack(masks, full, try_full)
+        if seq is None:
             state["log"].append(f"Pot4: Failed to place {team['name']} feasibly.")
             state["error"] = f"Pot 4 failed: no feasible assignment after drawing {team['name']}."
-            state.setdefault("p4_queue", []).insert(0, team)
+            state.setdefault("p4_queue", deque()).appendleft(team)
             return
 
-        gfinal, seq = res
-        state["groups"] = gfinal
         for gg, tt in seq:
-            if tt in state["pots"]["pot4"]:
-                state["pots"]["pot4"].remove(tt)
-            if "p4_queue" in state and tt in state["p4_queue"]:
-                state["p4_queue"].remove(tt)
+            place_team(state, gg, tt)
             state["log"].append(f"Pot4: {tt['name']} to Group {gg}")
+        committed = {tt["name"] for _, tt in seq}
+        pot = state["pots"]["pot4"]
+        pot[:] = [t for t in pot if t["name"] not in committed]
         clear_queues(state, ["p4_queue"])
         return
 
@@ -470,9 +686,35 @@ def complete_draw(state: Dict) -> bool:
     if state["pots"]["pot1"]:
         pot1(state)
     if state["pots"]["pot2"]:
-        if not pot2(state): return False
+        if not match_pot(state, "pot2", required_size=1): return False
     if state["pots"]["pot3"]:
-        if not pot3(state): return False
+        if not match_pot(state, "pot3", required_size=2): return False
     if state["pots"]["pot4"]:
-        if not pot4(state): return False
+        if not match_pot(state, "pot4", required_size=3): return False
     return True
+
+def pots_key(pots: Dict[str, List[Dict]]) -> Tuple:
+    """Hashable snapshot of the pots: ((pot_label, ((name, confederation, pot), ...)), ...)."""
+    return tuple(
+        (label, tuple((t["name"], t["confederation"], t["pot"]) for t in pots.get(label, [])))
+        for label in POT_LABELS
+    )
+
+def compute_full_draw(
+    key: Tuple,
+    seed: Optional[int]
+) -> Tuple[Dict[str, List[Dict]], Dict[str, List[Dict]], List[str], Optional[str]]:
+    """
+    Run a whole draw from scratch on a private state built from a pots_key
+    snapshot. Deterministic for a fixed seed, so callers may memoize it.
+    Returns (groups, pots, log, error).
+    """
+    state: Dict = {
+        "pots": {label: [{"name": n, "confederation": c, "pot": p} for n, c, p in teams] for label, teams in key},
+        "groups": {g: [] for g in GROUPS},
+        "log": [],
+        "seed": seed,
+    }
+    reset_tracking(state)
+    complete_draw(state)
+    return state["groups"], state["pots"], state["log"], state.get("error")